@@ -6,8 +6,11 @@ SharkGuard Streamlit app
 - Run: streamlit run app.py
 """
 import streamlit as st
-import pandas as pd
 from pathlib import Path
+import gc
+import hashlib
+import itertools
+import importlib.util
 import traceback
 
 # Paths
@@ -15,14 +18,18 @@ MODEL_PATH = Path("models/isolation_model.joblib")
 SIM_FEATURES = Path("data/simulated_features.csv")
 MODELS_DIR = MODEL_PATH.parent
 DATA_DIR = SIM_FEATURES.parent
+MAX_TRAIN_ROWS = 50_000  # larger feature files are uniformly subsampled for training
 
 # Ensure directories exist
 MODELS_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-# Attempt to import required project modules; show an informative error if they are missing.
+# Check the required project modules are present; show an informative error if they are missing.
+# sharkguard.core (and pandas) are imported lazily in the handlers that need them,
+# so sidebar-only interactions don't pay for those imports.
 try:
-    from sharkguard.core import SharkGuardModel, txs_to_dataframe, extract_wallet_features, train_and_persist_model
+    if importlib.util.find_spec("sharkguard.core") is None:
+        raise ModuleNotFoundError("No module named 'sharkguard.core'")
 except Exception as e:
     st.set_page_config(page_title="SharkGuard - Missing modules", layout="centered")
     st.title("🦈 SharkGuard — Missing project files")
@@ -36,19 +43,178 @@ except Exception as e:
 
 # Try to import Etherscan util. If missing we provide a simple stub (app will continue but fetch won't work).
 try:
-    from utils.etherscan import fetch_transactions
+    from utils.etherscan import fetch_transactions, iter_transactions, EtherscanRateLimit, EtherscanAuthError
 except Exception:
     def fetch_transactions(address, api_key, *args, **kwargs):
         # fallback: return empty list so UI still runs
         return []
 
-# Cache model loading so Streamlit doesn't reload it every rerun
-@st.cache_resource
-def load_model(path: str):
+    def iter_transactions(address, api_key, *args, **kwargs):
+        return iter(())
+
+    class EtherscanRateLimit(Exception):
+        pass
+
+    class EtherscanAuthError(Exception):
+        pass
+
+# Cache on-chain fetches so re-analyzing the same wallet doesn't hit Etherscan again.
+# The key is only hashed into the cache key; the raw key is passed as an unhashed
+# (underscore-prefixed) argument so it never ends up in Streamlit's cache.
+# Only the newest max_tx transactions are fetched (newest-first, then reversed to
+# oldest-first), so the number of requests is bounded by the sidebar limit.
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_fetch(address, api_key_hash, max_tx, _api_key):
+    newest = itertools.islice(
+        iter_transactions(address, _api_key, sort="desc", page_size=min(1000, max_tx)), max_tx
+    )
+    return list(newest)[::-1]
+
+# Parse the simulated features CSV once per file version; mtime is part of the
+# cache key so regenerating the file invalidates it.
+@st.cache_data(show_spinner=False)
+def _load_sim_features(path: str, mtime: float):
+    import pandas as pd
+    # pyarrow's multithreaded reader; keep numpy-backed columns for sklearn but
+    # store floats as float32 to halve memory.
+    df = pd.read_csv(path, engine="pyarrow")
+    float_cols = df.select_dtypes(include="float64").columns
+    return df.astype({c: "float32" for c in float_cols})
+
+def _load_training_frame(path: str, max_rows: int = MAX_TRAIN_ROWS, chunksize: int = 50_000):
+    # Stream the CSV in chunks and keep a uniform random sample of at most max_rows
+    # rows (smallest random keys win), so peak memory stays bounded. Floats are
+    # stored as float32, as in _load_sim_features(); the reader's running index is
+    # kept so the sample can be put back in file order.
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    kept = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        float_cols = chunk.select_dtypes(include="float64").columns
+        chunk = chunk.astype({c: "float32" for c in float_cols})
+        chunk["__sample_key"] = rng.random(len(chunk))
+        kept = chunk if kept is None else pd.concat([kept, chunk])
+        if len(kept) > max_rows:
+            kept = kept.nsmallest(max_rows, "__sample_key")
+    if kept is None:
+        return pd.DataFrame()
+    return kept.drop(columns="__sample_key").sort_index().reset_index(drop=True)
+
+# Cache model loading so Streamlit doesn't reload it every rerun.
+# mtime is part of the key so a retrained/uploaded file is picked up; max_entries=1
+# drops the old model when the file changes outside the app (e.g. a CLI retrain).
+@st.cache_resource(max_entries=1)
+def load_model(path: str, mtime: float):
+    from sharkguard.core import SharkGuardModel
     sg = SharkGuardModel()
     sg.load(path)
     return sg
 
+def reload_model():
+    # Drop the cached instance first so the old and new models aren't held at once.
+    load_model.clear()
+    gc.collect()
+    return load_model(str(MODEL_PATH), MODEL_PATH.stat().st_mtime)
+
+# Analyze panel runs as a fragment so clicking Analyze reruns only this panel, not the
+# model loading/uploader/training code above.
+@st.fragment
+def analyze_panel(sg, wallet, etherscan_key, use_sample, max_tx):
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        st.subheader("Analyze wallet")
+        analyze = st.button("🔍 Analyze")
+
+    with col2:
+        if SIM_FEATURES.exists():
+            st.caption(f"Sim features: {SIM_FEATURES.name}")
+        else:
+            st.caption("No simulated features found")
+
+    # When Analyze is pressed
+    if analyze:
+        if use_sample:
+            # show a random row from simulated features CSV
+            if SIM_FEATURES.exists():
+                df_feats = _load_sim_features(str(SIM_FEATURES), SIM_FEATURES.stat().st_mtime)
+                st.success("Loaded simulated features — showing a random sample")
+                st.dataframe(df_feats.sample(1).T)
+            else:
+                st.error("Simulated features file not present. Run: python data/simulate.py")
+        else:
+            if not wallet:
+                st.error("Please enter a wallet address (0x...) or enable 'Use simulated sample features'.")
+            else:
+                # Fetch transactions (may be empty)
+                txs = []
+                if etherscan_key:
+                    try:
+                        with st.spinner("Fetching transactions from Etherscan..."):
+                            key_hash = hashlib.sha256(etherscan_key.encode()).hexdigest()
+                            txs = _cached_fetch(wallet, key_hash, max_tx, etherscan_key)
+                    except EtherscanRateLimit:
+                        st.warning("Rate limited by Etherscan — retry in a moment.")
+                        txs = []
+                    except EtherscanAuthError as e:
+                        st.error("Etherscan rejected the API key: " + str(e))
+                        txs = []
+                    except Exception as e:
+                        st.error("Etherscan fetch failed: " + str(e))
+                        txs = []
+                else:
+                    st.info("No Etherscan key provided — will not fetch on-chain transactions (empty).")
+
+                if len(txs) >= max_tx:
+                    st.caption(f"Analyzing the most recent {max_tx} transactions.")
+
+                # Convert to dataframe and extract features
+                try:
+                    import pandas as pd
+                    from sharkguard.core import txs_to_dataframe, extract_wallet_features
+                    from utils.heuristics import explain
+                except Exception as e:
+                    st.error("Analysis dependencies failed to import: " + repr(e))
+                    st.text(traceback.format_exc())
+                    return
+                try:
+                    df = txs_to_dataframe(txs)
+                except Exception as e:
+                    st.error("Failed to convert transactions to DataFrame: " + str(e))
+                    df = pd.DataFrame()
+
+                feat = extract_wallet_features(df, wallet)
+                st.subheader("Extracted features")
+                st.json(feat)
+
+                # Model inference
+                if sg is None:
+                    st.warning("No model loaded. Train or upload a model to get a suspicion score.")
+                else:
+                    try:
+                        res = sg.predict_score(feat)
+                        st.metric("Suspicion Score (0 = normal, 1 = suspicious)", f"{res['score']:.3f}")
+                        st.write("Label:", res["label"])
+                        st.write("Raw model score:", res["raw"])
+                    except Exception as e:
+                        st.error("Model prediction failed: " + str(e))
+                        st.text(traceback.format_exc())
+
+                # Heuristic explanations
+                st.subheader("Heuristic signals")
+                expl = explain(feat)
+                for e in expl:
+                    st.write("- ", e)
+
+                # Show raw txs
+                st.subheader("Raw transactions (first 20)")
+                if not df.empty:
+                    st.dataframe(df.head(20), use_container_width=True, height=400)
+                else:
+                    st.write("No transactions to show (empty).")
+
+
 # UI
 st.set_page_config(page_title="SharkGuard", layout="centered")
 st.title("🦈 SharkGuard — Web3 Fake Account Detector")
@@ -57,6 +223,8 @@ st.sidebar.header("Settings")
 etherscan_key = st.sidebar.text_input("Etherscan API Key (optional)", type="password")
 wallet = st.sidebar.text_input("Wallet address (0x...)")
 use_sample = st.sidebar.checkbox("Use simulated sample features (no on-chain fetch)", value=False)
+max_tx = st.sidebar.number_input("Max transactions to analyze", min_value=100, max_value=10000,
+                                 value=2000, step=100)
 
 # Model controls
 st.sidebar.markdown("---")
@@ -65,7 +233,7 @@ model_status = "Not loaded"
 sg = None
 if MODEL_PATH.exists():
     try:
-        sg = load_model(str(MODEL_PATH))
+        sg = load_model(str(MODEL_PATH), MODEL_PATH.stat().st_mtime)
         model_status = f"Loaded from {MODEL_PATH}"
     except Exception as e:
         model_status = f"Failed to load ({e})"
@@ -74,7 +242,7 @@ st.sidebar.write(model_status)
 if st.sidebar.button("🔁 Reload model"):
     if MODEL_PATH.exists():
         try:
-            sg = load_model(str(MODEL_PATH))
+            sg = reload_model()
             st.sidebar.success("Model reloaded.")
         except Exception as e:
             st.sidebar.error("Reload failed: " + str(e))
@@ -85,9 +253,11 @@ if st.sidebar.button("🔁 Reload model"):
 uploaded = st.sidebar.file_uploader("Upload model (.joblib)", type=["joblib"])
 if uploaded is not None:
     try:
-        data = uploaded.read()
-        MODEL_PATH.write_bytes(data)
-        sg = load_model(str(MODEL_PATH))
+        # The uploader keeps its file across reruns; only save and reload a new upload.
+        if st.session_state.get("uploaded_model_id") != uploaded.file_id:
+            MODEL_PATH.write_bytes(uploaded.getvalue())
+            sg = reload_model()
+            st.session_state["uploaded_model_id"] = uploaded.file_id
         st.sidebar.success("Uploaded and loaded model.")
     except Exception as e:
         st.sidebar.error("Failed to save/load uploaded model: " + str(e))
@@ -97,9 +267,10 @@ st.sidebar.markdown("---")
 if st.sidebar.button("⚙️ Train model from simulated data"):
     if SIM_FEATURES.exists():
         try:
-            df = pd.read_csv(SIM_FEATURES)
+            from sharkguard.core import train_and_persist_model
+            df = _load_training_frame(str(SIM_FEATURES))
             train_and_persist_model(df, path=str(MODEL_PATH))
-            sg = load_model(str(MODEL_PATH))
+            sg = reload_model()
             st.sidebar.success("Model trained and saved to " + str(MODEL_PATH))
         except Exception as e:
             st.sidebar.error("Training failed: " + str(e))
@@ -112,87 +283,4 @@ st.sidebar.markdown("Need help? Make sure `sharkguard/core.py` and `utils/ethers
 
 # Main area
 st.write("Use the sidebar to load/train/upload a model. Then enter a wallet and click Analyze.")
-col1, col2 = st.columns([3, 1])
-
-with col1:
-    st.subheader("Analyze wallet")
-    analyze = st.button("🔍 Analyze")
-
-with col2:
-    if SIM_FEATURES.exists():
-        st.caption(f"Sim features: {SIM_FEATURES.name}")
-    else:
-        st.caption("No simulated features found")
-
-# When Analyze is pressed
-if analyze:
-    if use_sample:
-        # show a random row from simulated features CSV
-        if SIM_FEATURES.exists():
-            df_feats = pd.read_csv(SIM_FEATURES)
-            st.success("Loaded simulated features — showing a random sample")
-            st.dataframe(df_feats.sample(1).T)
-        else:
-            st.error("Simulated features file not present. Run: python data/simulate.py")
-    else:
-        if not wallet:
-            st.error("Please enter a wallet address (0x...) or enable 'Use simulated sample features'.")
-        else:
-            # Fetch transactions (may be empty)
-            txs = []
-            if etherscan_key:
-                try:
-                    with st.spinner("Fetching transactions from Etherscan..."):
-                        txs = fetch_transactions(wallet, etherscan_key)
-                except Exception as e:
-                    st.error("Etherscan fetch failed: " + str(e))
-                    txs = []
-            else:
-                st.info("No Etherscan key provided — will not fetch on-chain transactions (empty).")
-
-            # Convert to dataframe and extract features
-            try:
-                df = txs_to_dataframe(txs)
-            except Exception as e:
-                st.error("Failed to convert transactions to DataFrame: " + str(e))
-                df = pd.DataFrame()
-
-            feat = extract_wallet_features(df, wallet)
-            st.subheader("Extracted features")
-            st.json(feat)
-
-            # Model inference
-            if sg is None:
-                st.warning("No model loaded. Train or upload a model to get a suspicion score.")
-            else:
-                try:
-                    res = sg.predict_score(feat)
-                    st.metric("Suspicion Score (0 = normal, 1 = suspicious)", f"{res['score']:.3f}")
-                    st.write("Label:", res["label"])
-                    st.write("Raw model score:", res["raw"])
-                except Exception as e:
-                    st.error("Model prediction failed: " + str(e))
-                    st.text(traceback.format_exc())
-
-            # Heuristic explanations
-            st.subheader("Heuristic signals")
-            expl = []
-            if feat.get("tx_count", 0) < 3:
-                expl.append("Very few transactions — new or dormant account")
-            if feat.get("tx_freq_per_day", 0) > 50:
-                expl.append("Extremely high transaction frequency — bot-like behavior")
-            if feat.get("repeated_ratio", 0) > 0.6:
-                expl.append("High repeated_ratio — interacting with the same counterparty often")
-            if feat.get("hour_entropy", 10) < 1.0:
-                expl.append("Low hour entropy — very regular timing")
-            if not expl:
-                expl.append("No strong heuristic flags detected ✅")
-            for e in expl:
-                st.write("- ", e)
-
-            # Show raw txs
-            st.subheader("Raw transactions (first 20)")
-            if not df.empty:
-                st.dataframe(df.head(20))
-            else:
-                st.write("No transactions to show (empty).")
+analyze_panel(sg, wallet, etherscan_key, use_sample, max_tx)
@@ -2,38 +2,313 @@
 """
 Simple wrapper to fetch Ethereum transactions from the Etherscan API.
 
-Requires an Etherscan API key.
+Requires an Etherscan API key. API errors raise EtherscanError subclasses
+(EtherscanRateLimit, EtherscanAuthError) instead of returning an empty list.
 Usage:
     from utils.etherscan import fetch_transactions
     txs = fetch_transactions("0x1234...", "YOUR_API_KEY")
+
+    # or stream page by page without building the full list
+    for tx in iter_transactions("0x1234...", "YOUR_API_KEY"):
+        ...
+
+    # normal, internal and ERC-20 token transfers, fetched concurrently
+    normal, internal, tokens = fetch_transactions_full("0x1234...", "YOUR_API_KEY")
 """
 
+import asyncio
+import collections
+import logging
+import time
+from threading import Lock
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ResponseError
+from urllib3.util.retry import Retry
+
+# orjson parses large txlist responses several times faster; fall back to stdlib json.
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+ETHERSCAN_BASE = "https://api.etherscan.io/v2/api"
+DEFAULT_CHAIN_ID = 1  # Ethereum mainnet
+# txlist rejects any request where page * offset exceeds this ("Result window is too large").
+MAX_RESULT_WINDOW = 10_000
+
+log = logging.getLogger(__name__)
+
+
+class EtherscanError(RuntimeError):
+    """Etherscan returned an error (as opposed to simply no transactions)."""
 
-ETHERSCAN_BASE = "https://api.etherscan.io/api"
 
+class EtherscanRateLimit(EtherscanError):
+    """The API key's rate limit was hit; retry after a short pause."""
 
-def fetch_transactions(address, api_key, startblock=0, endblock=99999999, sort="asc"):
+
+class EtherscanAuthError(EtherscanError):
+    """The API key is missing or was rejected."""
+
+
+def _check_response(data):
     """
-    Return a list of transactions (dicts) for a given address.
-    If API key is missing or API returns an error, returns [].
+    Return the result list of a decoded Etherscan response.
+    "No transactions found" and "Result window is too large" (paged past the
+    10k window) give []; any other error raises an EtherscanError subclass.
+    """
+    if data.get("status") == "1":
+        return data.get("result", [])
+    message = str(data.get("message", ""))
+    detail = data.get("result")
+    detail = detail if isinstance(detail, str) else ""
+    text = f"{message} {detail}".lower()
+    if message.startswith("No transactions found") or not text.strip():
+        return []
+    if "result window is too large" in text:
+        return []  # end of the pageable data, not an error
+    if "max rate" in text or "rate limit" in text:
+        raise EtherscanRateLimit(detail or message)
+    if "api key" in text or "apikey" in text:
+        raise EtherscanAuthError(detail or message)
+    raise EtherscanError(detail or message)
+
+
+def _describe(e):
+    """
+    Short description of a request failure without the request URL, which
+    carries the API key (requests/httpx put it in str(e)).
+    """
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        reason = getattr(response, "reason", None) or getattr(response, "reason_phrase", "")
+        return f"HTTP {status} {reason}".strip()
+    if isinstance(e, requests.exceptions.RetryError) and e.args:
+        reason = getattr(e.args[0], "reason", None)
+        if isinstance(reason, ResponseError):
+            return f"retries exhausted ({reason})"  # e.g. "too many 503 error responses"
+    return type(e).__name__
+
+
+def _typed_error(e):
+    """
+    Map a request exception to an EtherscanError with a sanitized message:
+    HTTP 429 (or retries exhausted on 429) becomes EtherscanRateLimit; 5xx
+    outages and network errors become a plain EtherscanError.
+    """
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(e, requests.exceptions.RetryError) and e.args:
+        reason = getattr(e.args[0], "reason", None)
+        if isinstance(reason, ResponseError) and "429" in str(reason):
+            status = 429
+    if status == 429:
+        return EtherscanRateLimit(_describe(e))
+    return EtherscanError(_describe(e))
+
+
+# Shared session so repeated calls reuse the TCP/TLS connection (keep-alive),
+# with exponential backoff on rate limits and transient server errors.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        ),
+    ),
+)
+
+# Free-tier keys are capped at 5 calls/sec; pace ourselves at 4/sec so calls
+# wait briefly instead of being rejected.
+_RATE_LIMIT_PER_SEC = 4
+_RATE_LOCK = Lock()
+_LAST_CALLS = collections.deque(maxlen=_RATE_LIMIT_PER_SEC)
+
+
+def _throttle():
+    """Block until another request fits in the rolling one-second window."""
+    with _RATE_LOCK:
+        now = time.monotonic()
+        if len(_LAST_CALLS) == _LAST_CALLS.maxlen and now - _LAST_CALLS[0] < 1.0:
+            time.sleep(1.0 - (now - _LAST_CALLS[0]))
+        _LAST_CALLS.append(time.monotonic())
+
+
+def _iter_pages(address, api_key, startblock, endblock, sort, chainid, page_size):
+    """
+    Yield each page of txlist results (a list of dicts) until a short page or the
+    end of Etherscan's MAX_RESULT_WINDOW (the first 10,000 rows, as a single call returns).
     """
     params = {
+        "chainid": chainid,
         "module": "account",
         "action": "txlist",
         "address": address,
         "startblock": startblock,
         "endblock": endblock,
         "sort": sort,
+        "offset": page_size,
         "apikey": api_key,
     }
-    try:
-        r = requests.get(ETHERSCAN_BASE, params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-        if data.get("status") != "1":
-            return []  # no txs or error
-        return data.get("result", [])
-    except Exception as e:
-        print("⚠️  Etherscan request failed:", e)
-        return []
+    page = 1
+    while True:
+        params["page"] = page
+        try:
+            _throttle()
+            r = _SESSION.get(ETHERSCAN_BASE, params=params, timeout=(3.05, 20))
+            r.raise_for_status()
+            result = _check_response(_loads(r.content))
+        except Exception as e:
+            log.warning("Etherscan txlist request failed (page %d): %s", page, _describe(e))
+            if isinstance(e, EtherscanError):
+                raise
+            raise _typed_error(e) from e
+        if not result:
+            return  # no (more) txs
+        yield result
+        if len(result) < page_size or (page + 1) * page_size > MAX_RESULT_WINDOW:
+            return
+        page += 1
+
+
+def iter_transactions(address, api_key, startblock=0, endblock=99999999, sort="asc",
+                      chainid=DEFAULT_CHAIN_ID, page_size=1000):
+    """
+    Yield transactions (dicts) for a given address, one page at a time.
+    Only `page_size` rows are held in memory per request. Like a single txlist call,
+    at most MAX_RESULT_WINDOW rows are returned.
+    Raises EtherscanRateLimit / EtherscanAuthError / EtherscanError on API errors.
+    """
+    for result in _iter_pages(address, api_key, startblock, endblock, sort, chainid, page_size):
+        yield from result
+
+
+def fetch_transactions(address, api_key, startblock=0, endblock=99999999, sort="asc",
+                       chainid=DEFAULT_CHAIN_ID):
+    """
+    Return a list of transactions (dicts) for a given address.
+    Pass `chainid` to query another Etherscan V2 network (default: mainnet).
+    Returns [] if the wallet has no transactions; raises an EtherscanError
+    subclass (e.g. EtherscanRateLimit) if the API returns an error.
+    """
+    return list(iter_transactions(address, api_key, startblock=startblock, endblock=endblock,
+                                  sort=sort, chainid=chainid))
+
+
+# Columns kept by fetch_transactions_soa() and the numpy dtype each is parsed into.
+SOA_COLUMNS = {
+    "hash": "object",
+    "blockNumber": "int64",
+    "timeStamp": "int64",
+    "from": "object",
+    "to": "object",
+    "value": "float64",  # wei; float64 is precise enough for features
+    "gas": "int64",
+    "gasPrice": "int64",
+    "isError": "int8",
+}
+
+
+def fetch_transactions_soa(address, api_key, startblock=0, endblock=99999999, sort="asc",
+                           chainid=DEFAULT_CHAIN_ID, page_size=1000):
+    """
+    Return transactions as a dict of column name -> numpy array (see SOA_COLUMNS)
+    instead of a list of dicts; wrap with pd.DataFrame(cols, copy=False).
+    Each page is parsed straight into preallocated typed arrays.
+    Returns empty arrays if the wallet has no transactions; errors raise as in
+    fetch_transactions().
+    """
+    import numpy as np
+
+    chunks = {col: [] for col in SOA_COLUMNS}
+    for result in _iter_pages(address, api_key, startblock, endblock, sort, chainid, page_size):
+        n = len(result)
+        page = {col: np.empty(n, dtype=dt) for col, dt in SOA_COLUMNS.items()}
+        for i, t in enumerate(result):
+            page["hash"][i] = t["hash"]
+            page["blockNumber"][i] = int(t["blockNumber"])
+            page["timeStamp"][i] = int(t["timeStamp"])
+            page["from"][i] = t["from"]
+            page["to"][i] = t["to"]
+            page["value"][i] = float(t["value"])
+            page["gas"][i] = int(t["gas"])
+            page["gasPrice"][i] = int(t["gasPrice"])
+            page["isError"][i] = int(t.get("isError", 0))
+        for col, arr in page.items():
+            chunks[col].append(arr)
+    return {
+        col: np.concatenate(parts) if parts else np.empty(0, dtype=SOA_COLUMNS[col])
+        for col, parts in chunks.items()
+    }
+
+
+FULL_ACTIONS = ("txlist", "txlistinternal", "tokentx")
+
+
+async def fetch_all(address, api_key, startblock=0, endblock=99999999, sort="asc",
+                    chainid=DEFAULT_CHAIN_ID, actions=FULL_ACTIONS):
+    """
+    Fetch several account lists (normal, internal and token transfers by default)
+    concurrently. Returns one list per action, in order; errors raise as in
+    fetch_transactions().
+    Requires httpx.
+    """
+    import httpx
+
+    sem = asyncio.Semaphore(4)
+    failures = []  # in the order they happened
+
+    async def _one(client, action):
+        params = {
+            "chainid": chainid,
+            "module": "account",
+            "action": action,
+            "address": address,
+            "startblock": startblock,
+            "endblock": endblock,
+            "sort": sort,
+            "apikey": api_key,
+        }
+        async with sem:
+            try:
+                # the limiter blocks, so run it off the event loop
+                await asyncio.to_thread(_throttle)
+                r = await client.get(ETHERSCAN_BASE, params=params)
+                r.raise_for_status()
+                return _check_response(_loads(r.content))
+            except Exception as e:
+                log.warning("Etherscan %s request failed: %s", action, _describe(e))
+                err = e if isinstance(e, EtherscanError) else _typed_error(e)
+                failures.append(err)
+                if err is e:
+                    raise
+                raise err from e
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(20, connect=3.05)) as client:
+        tasks = [asyncio.create_task(_one(client, a)) for a in actions]
+        # On the first failure, cancel the rest before the client closes under them,
+        # then raise the earliest failure.
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # Retrieve every finished task's exception (several may have failed) so
+        # asyncio doesn't warn "Task exception was never retrieved".
+        for t in done:
+            t.exception()
+        if failures:
+            raise failures[0]
+        return [t.result() for t in tasks]
+
+
+def fetch_transactions_full(*args, **kwargs):
+    """Synchronous wrapper around fetch_all() for Streamlit/CLI callers."""
+    return asyncio.run(fetch_all(*args, **kwargs))
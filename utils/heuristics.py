@@ -0,0 +1,51 @@
+# utils/heuristics.py
+"""
+Rule-based explanations for SharkGuard wallet features.
+
+The thresholds are applied as one vectorized pass over an (N, 4) feature
+matrix, so many wallets can be triaged at once.
+Usage:
+    from utils.heuristics import explain, explain_batch
+    msgs = explain(feat)            # single feature dict
+    msgs_per_wallet = explain_batch(X)
+"""
+
+import numpy as np
+
+# Column order of the matrix passed to explain_batch(), with the value used
+# when a feature is missing from a dict (chosen so the rule does not fire).
+HEURISTIC_FEATURES = ("tx_count", "tx_freq_per_day", "repeated_ratio", "hour_entropy")
+_DEFAULTS = (0, 0, 0, 10)
+
+_THRESH = np.array([3, 50, 0.6, 1.0], dtype=np.float32)
+_OPS = (np.less, np.greater, np.greater, np.less)
+MSGS = (
+    "Very few transactions — new or dormant account",
+    "Extremely high transaction frequency — bot-like behavior",
+    "High repeated_ratio — interacting with the same counterparty often",
+    "Low hour entropy — very regular timing",
+)
+NO_FLAGS_MSG = "No strong heuristic flags detected ✅"
+
+
+def features_to_matrix(feats):
+    """Stack a list of feature dicts into a float32 (N, 4) matrix in HEURISTIC_FEATURES order."""
+    return np.array(
+        [[f.get(k, d) for k, d in zip(HEURISTIC_FEATURES, _DEFAULTS)] for f in feats],
+        dtype=np.float32,
+    ).reshape(-1, len(HEURISTIC_FEATURES))
+
+
+def explain_batch(X):
+    """
+    Return a list of triggered heuristic messages for each row of X,
+    an (N, 4) array in HEURISTIC_FEATURES order.
+    """
+    X = np.asarray(X, dtype=np.float32).reshape(-1, len(HEURISTIC_FEATURES))
+    flags = np.stack([op(X[:, i], _THRESH[i]) for i, op in enumerate(_OPS)], axis=1)
+    return [[MSGS[j] for j in np.flatnonzero(row)] for row in flags]
+
+
+def explain(feat):
+    """Return the heuristic messages for a single feature dict (never empty)."""
+    return explain_batch(features_to_matrix([feat]))[0] or [NO_FLAGS_MSG]